@@ -1,9 +1,15 @@
+import json
 import os
+from typing import NamedTuple
+
 import numpy as np
 import pandas as pd
 import streamlit as st
 import scipy.stats as stats
 import plotly.express as px
+import plotly.graph_objects as go
+
+from stats_kernels import resumo_1d
 
 st.set_page_config(
     page_title="Dashboard Profissional | Análise de Dados",
@@ -13,6 +19,21 @@ st.set_page_config(
 
 LINKEDIN_URL = "https://www.linkedin.com/in/caio-felipe-a7a67322a/"
 
+# Versão do cache Parquet de carregar_excel: incremente sempre que o tratamento da carga mudar
+# (datas, categorias, downcast...) para que caches antigos sejam ignorados e refeitos
+CACHE_VERSAO = 1
+
+CAMINHO_EXCEL = os.path.join("data", "df_selecionado.xlsx")
+
+# Colunas monetárias mantidas em float64 no downcast de carregar_excel
+COLUNAS_FLOAT64 = {"Valor_Pedido", "Valor_Pedido_BRL"}
+
+# Acima deste nº de grupos o boxplot volta ao px.box (quartis pré-calculados deixam de compensar)
+MAX_GRUPOS_BOX = 200
+
+# Formatos testados (em ordem) nas colunas de data; o Excel atual usa "%m-%d-%y" (ex.: 04-30-22)
+FORMATOS_DATA = ("%Y-%m-%d", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S", "%m-%d-%y")
+
 # =========================
 # SIDEBAR - CONTROLES DE DESEMPENHO
 # =========================
@@ -21,90 +42,329 @@ st.sidebar.header("⚡ Desempenho")
 MODO_LEVE = st.sidebar.toggle("Ativar Modo Leve (recomendado)", value=True, help="Usa amostra para gráficos e evita cálculos pesados automáticos.")
 USAR_AMOSTRA = st.sidebar.toggle("Usar amostra nos gráficos/testes", value=True)
 TAM_AMOSTRA = st.sidebar.slider("Tamanho da amostra", 500, 20000, 3000, 500, help="Quanto maior, mais pesado.")
-LIMITE_TABELA = st.sidebar.slider("Linhas para exibição de tabelas", 5, 200, 20, 5)
-st.sidebar.caption("Dica: se ficar pesado, diminua a amostra e as linhas de exibição.")
+st.sidebar.caption("Dica: se ficar pesado, diminua a amostra.")
 
 # =========================
 # FUNÇÕES DE SUPORTE
 # =========================
-@st.cache_data(show_spinner=False)
-def carregar_excel() -> pd.DataFrame:
-    """Carrega o Excel de data/df_selecionado.xlsx. Faz parse de datas e remove colunas 'Unnamed'."""
-    caminho = os.path.join("data", "df_selecionado.xlsx")
+def detectar_formato_data(serie: pd.Series, preferido: str | None = None) -> str | None:
+    """Testa os formatos conhecidos em até 100 valores não nulos; retorna o primeiro que converte todos."""
+    amostra = serie.dropna().astype(str).head(100)
+    if amostra.empty:
+        return None
+    candidatos = ([preferido] if preferido else []) + [f for f in FORMATOS_DATA if f != preferido]
+    for fmt in candidatos:
+        try:
+            pd.to_datetime(amostra, format=fmt, errors="raise")
+        except (ValueError, TypeError):
+            continue
+        return fmt
+    return None
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def carregar_excel(mtime: float) -> pd.DataFrame:
+    """Carrega o Excel de data/df_selecionado.xlsx. Faz parse de datas e remove colunas 'Unnamed'.
+
+    `mtime` (do Excel) entra só na chave do cache: editar o arquivo invalida a cópia em memória.
+
+    Na primeira execução grava uma cópia em Parquet ao lado do Excel; nas seguintes
+    lê o Parquet enquanto ele for mais recente que o Excel e da mesma `CACHE_VERSAO`
+    (evita o parse do openpyxl). Parquet ilegível cai de volta para o Excel.
+    """
+    caminho = CAMINHO_EXCEL
     if not os.path.exists(caminho):
         raise FileNotFoundError("Não encontrei data/df_selecionado.xlsx. Verifique o caminho/arquivo.")
 
-    # dtype_backend ajuda com nulos em numéricas
-    df = pd.read_excel(caminho, sheet_name=0, dtype_backend="numpy_nullable")
+    parquet_path = caminho + f".v{CACHE_VERSAO}.parquet"
+    if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(caminho):
+        try:
+            return pd.read_parquet(parquet_path, engine="pyarrow")
+        except Exception:
+            pass
+
+    # dtype_backend ajuda com nulos em numéricas; calamine (Rust) é bem mais rápido que o openpyxl
+    try:
+        df = pd.read_excel(caminho, sheet_name=0, dtype_backend="numpy_nullable", engine="calamine")
+    except ImportError:
+        df = pd.read_excel(caminho, sheet_name=0, dtype_backend="numpy_nullable")
 
-    # Parse de possíveis colunas de data
+    # Formatos de data descobertos numa carga anterior (gravados junto do Parquet)
+    formatos_path = caminho + ".formatos.json"
+    formatos_salvos = {}
+    if os.path.exists(formatos_path):
+        try:
+            with open(formatos_path, "r", encoding="utf-8") as f:
+                formatos_salvos = json.load(f)
+        except Exception:
+            pass
+
+    # Parse de possíveis colunas de data: formato explícito (caminho rápido em C) e inferência só como fallback
     possiveis_datas = [c for c in df.columns if "data" in c.lower()]
+    formatos = {}
     for c in possiveis_datas:
         try:
-            df[c] = pd.to_datetime(df[c], errors="coerce", dayfirst=False, infer_datetime_format=True)
+            if pd.api.types.is_datetime64_any_dtype(df[c]):
+                continue
+            fmt = detectar_formato_data(df[c], formatos_salvos.get(c))
+            if fmt:
+                df[c] = pd.to_datetime(df[c], format=fmt, errors="coerce")
+                formatos[c] = fmt
+            else:
+                df[c] = pd.to_datetime(df[c], errors="coerce", dayfirst=False)
         except Exception:
             pass
 
     # Remove colunas automáticas sem nome (ex.: 'Unnamed: 22')
-    df = df.loc[:, ~df.columns.astype(str).str.contains(r"^Unnamed")]
+    df = df.drop(columns=[c for c in df.columns if isinstance(c, str) and c.startswith("Unnamed")])
+
+    # Texto com poucos valores distintos vira 'category' (menos memória, unique/groupby mais rápidos)
+    # (com dtype_backend="numpy_nullable" o texto chega como 'string', não 'object')
+    for c in df.select_dtypes(include=["object", "string"]).columns:
+        if df[c].nunique(dropna=True) / max(len(df), 1) < 0.5:
+            df[c] = df[c].astype("category")
+
+    # Downcast numérico: float32 basta para gráficos/testes e corta a banda de memória pela metade
+    for c in df.select_dtypes(include=["Float64", "Float32", "float64"]).columns:
+        if c not in COLUNAS_FLOAT64:
+            df[c] = df[c].astype("float32")
+    for c in df.select_dtypes(include=["Int64", "int64"]).columns:
+        df[c] = pd.to_numeric(df[c], downcast="integer")
+
+    # Cache em Parquet para as próximas inicializações (se falhar, segue só com o Excel).
+    # Grava num temporário e troca atomicamente: um arquivo pela metade nunca fica no caminho final.
+    try:
+        tmp_path = parquet_path + ".tmp"
+        df.to_parquet(tmp_path, engine="pyarrow", compression="snappy", index=False)
+        os.replace(tmp_path, parquet_path)
+        with open(formatos_path, "w", encoding="utf-8") as f:
+            json.dump(formatos, f)
+    except Exception:
+        pass
 
     return df
 
-def identificar_colunas(df: pd.DataFrame) -> tuple[list[str], list[str]]:
-    """Separa colunas numéricas e categóricas por dtype."""
-    num = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
-    cat = [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])]
+@st.cache_data(show_spinner=False)
+def _classificar_colunas(_df: pd.DataFrame, assinatura: tuple[tuple[str, str], ...]) -> tuple[list[str], list[str]]:
+    """select_dtypes numa passada; o cache usa (coluna, dtype) como chave em vez do DF inteiro."""
+    num = _df.select_dtypes(include=np.number).columns.tolist()
+    num_set = set(num)
+    cat = [c for c in _df.columns if c not in num_set]
     return num, cat
 
+def identificar_colunas(df: pd.DataFrame) -> tuple[list[str], list[str]]:
+    """Separa colunas numéricas e categóricas por dtype ('category', texto e booleanos ficam em categóricas)."""
+    assinatura = tuple(zip(df.columns, df.dtypes.astype(str)))
+    return _classificar_colunas(df, assinatura)
+
+@st.cache_resource(show_spinner=False)
+def _reg() -> dict:
+    """Registro de DataFrames por id: as funções cacheadas recebem o id (string curta) em vez do DF."""
+    return {}
+
+def _frame(df_id: str) -> pd.DataFrame:
+    """DataFrame de um id do registro.
+
+    Ids de amostra têm a forma '<id da base>|<tamanho>' e ocupam um único slot 'df_viz',
+    sobrescrito quando o tamanho muda; se o slot for de outro tamanho, a amostra é refeita.
+    """
+    reg = _reg()
+    if "|" not in df_id:
+        return reg[df_id]
+    slot = reg.get("df_viz")
+    if slot is None or slot[0] != df_id:
+        base_id, n = df_id.rsplit("|", 1)
+        base = reg[base_id]
+        slot = (df_id, base.iloc[indice_amostra(len(base), int(n))])
+        reg["df_viz"] = slot
+    return slot[1]
+
+def valores_viz(viz_id: str, coluna: str) -> np.ndarray:
+    """Array float64 da coluna numérica restrito às linhas da amostra `viz_id` (mesmo índice de `_frame`)."""
+    if "|" not in viz_id:
+        return numeric_arrays(viz_id)[coluna]
+    base_id, n = viz_id.rsplit("|", 1)
+    arr = numeric_arrays(base_id)[coluna]
+    return arr[indice_amostra(len(arr), int(n))]
+
+@st.cache_resource(show_spinner=False)
+def numeric_arrays(df_id: str) -> dict[str, np.ndarray]:
+    """Arrays float64 (NaN nos nulos) de cada coluna numérica, convertidos uma vez (somente leitura)."""
+    df = _frame(df_id)
+    arrays = {}
+    for c in identificar_colunas(df)[0]:
+        arr = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        arr.setflags(write=False)  # compartilhado entre sessões via cache_resource
+        arrays[c] = arr
+    return arrays
+
 @st.cache_data(show_spinner=False)
-def tabela_tipos(df: pd.DataFrame) -> pd.DataFrame:
+def tabela_tipos(df_id: str) -> pd.DataFrame:
     """Tabela com coluna, dtype e % de nulos para exibição (cacheada)."""
-    info = []
+    df = _frame(df_id)
     n = len(df)
-    for col in df.columns:
-        nulls = df[col].isna().sum()
-        null_pct = (nulls / n) * 100 if n else 0.0
-        info.append({"coluna": col, "dtype": str(df[col].dtype), "%_nulos": round(null_pct, 2)})
-    return pd.DataFrame(info)
+    nulls = df.isna().sum()
+    dtypes = df.dtypes.astype(str)
+    return pd.DataFrame({
+        "coluna": df.columns,
+        "dtype": dtypes.values,
+        "%_nulos": (nulls.values / max(n, 1) * 100).round(2),
+    })
 
-def estatisticas_basicas(df: pd.DataFrame, colunas_numericas: list[str]) -> pd.DataFrame:
+@st.cache_data(show_spinner=False)
+def estatisticas_basicas(df_id: str, colunas_numericas: tuple[str, ...]) -> pd.DataFrame:
     """Resumo descritivo com count, média, mediana, desvio, variância, min, max."""
     if not colunas_numericas:
         return pd.DataFrame()
 
-    resumo = []
+    # Kernel de Welford (Numba, ou NumPy sem ele): count/média/variância/min/max numa passada por coluna
+    arrays = numeric_arrays(df_id)
+    linhas = []
     for c in colunas_numericas:
-        serie = pd.to_numeric(df[c], errors="coerce")
-        resumo.append({
-            "coluna": c,
-            "count": int(serie.count()),
-            "mean": float(serie.mean()) if serie.count() else np.nan,
-            "median": float(serie.median()) if serie.count() else np.nan,
-            "std": float(serie.std(ddof=1)) if serie.count() > 1 else np.nan,
-            "var": float(serie.var(ddof=1)) if serie.count() > 1 else np.nan,
-            "min": float(serie.min()) if serie.count() else np.nan,
-            "max": float(serie.max()) if serie.count() else np.nan,
+        arr = arrays[c]
+        count, media, var, mn, mx = resumo_1d(arr)
+        linhas.append({
+            "coluna": c, "count": count, "mean": media, "median": float(np.nanmedian(arr)) if count else np.nan,
+            "std": float(np.sqrt(var)), "var": var, "min": mn, "max": mx,
         })
-    return pd.DataFrame(resumo)
-
-def ic_media(amostra: pd.Series, alpha: float = 0.05) -> tuple[float, tuple[float, float]]:
-    """IC 100*(1-alpha)% para a média (t-Student)."""
-    amostra = pd.to_numeric(amostra, errors="coerce").dropna()
-    n = len(amostra)
-    media = amostra.mean() if n else np.nan
-    s = amostra.std(ddof=1) if n > 1 else np.nan
+    return pd.DataFrame(linhas)
+
+def ic_t(n: int, media: float, var: float, alpha: float = 0.05) -> tuple[float, tuple[float, float]]:
+    """IC t-Student a partir de n, média e variância (ddof=1) já calculados."""
+    s = np.sqrt(var)
     if n <= 1 or pd.isna(s) or s == 0:
         return float(media), (np.nan, np.nan)
     t_crit = stats.t.ppf(1 - alpha / 2, df=n - 1)
     erro = t_crit * s / np.sqrt(n)
     return float(media), (float(media - erro), float(media + erro))
 
+class ResultadoWelch(NamedTuple):
+    media_a: float
+    ic_a: tuple[float, float]
+    media_b: float
+    ic_b: tuple[float, float]
+    t_stat: float
+    p_val: float
+
+@st.cache_data(show_spinner=False)
+def group_moments(df_id: str, grupo: str, metrica: str) -> tuple[pd.DataFrame, float]:
+    """n, soma e soma dos quadrados da métrica por grupo, num único groupby (índice = grupo).
+
+    As somas são de `x - centro` (centro = média geral da métrica): centrar antes de somar
+    evita o cancelamento catastrófico de ss - s²/n quando a média é grande frente ao desvio.
+    """
+    df = _frame(df_id)
+    x = valores_viz(df_id, metrica)  # float64 já convertido, mesma ordem de linhas de _frame(df_id)
+    centro = float(np.nanmean(x)) if np.isfinite(x).any() else 0.0
+    x = x - centro
+    dados = pd.DataFrame({"g": df[grupo].reset_index(drop=True), "x": x, "x2": x * x})
+    momentos = dados.groupby("g", observed=True).agg(n=("x", "count"), s=("x", "sum"), ss=("x2", "sum"))
+    return momentos, centro
+
+def momentos_grupo(momentos: pd.DataFrame, grupo) -> tuple[int, float, float]:
+    """(n, soma, soma dos quadrados) de um grupo; zeros se ele não aparece na base."""
+    if grupo not in momentos.index:
+        return 0, 0.0, 0.0
+    linha = momentos.loc[grupo]
+    return int(linha["n"]), float(linha["s"]), float(linha["ss"])
+
+@st.cache_data(show_spinner=False)
+def welch_report(
+    mom_a: tuple[int, float, float],
+    mom_b: tuple[int, float, float],
+    centro: float = 0.0,
+    alpha: float = 0.05,
+) -> ResultadoWelch:
+    """ICs das médias de A e B + teste t de Welch calculados direto dos momentos (n, soma, soma²).
+
+    `centro` é o deslocamento usado em `group_moments`; só as médias precisam dele.
+    """
+    (n_a, s_a, ss_a), (n_b, s_b, ss_b) = mom_a, mom_b
+    media_a = centro + s_a / n_a if n_a else np.nan
+    media_b = centro + s_b / n_b if n_b else np.nan
+    if n_a < 2 or n_b < 2:
+        return ResultadoWelch(media_a, (np.nan, np.nan), media_b, (np.nan, np.nan), np.nan, np.nan)
+
+    # ss - s²/n pode sair levemente negativo por arredondamento em grupos quase constantes
+    var_a = max((ss_a - s_a * s_a / n_a) / (n_a - 1), 0.0)
+    var_b = max((ss_b - s_b * s_b / n_b) / (n_b - 1), 0.0)
+    _, ic_a = ic_t(n_a, media_a, var_a, alpha)
+    _, ic_b = ic_t(n_b, media_b, var_b, alpha)
+
+    se2_a, se2_b = var_a / n_a, var_b / n_b
+    se = np.sqrt(se2_a + se2_b)
+    if se == 0:
+        return ResultadoWelch(media_a, ic_a, media_b, ic_b, np.nan, np.nan)
+    t_stat = (media_a - media_b) / se
+    gl = se**4 / (se2_a**2 / (n_a - 1) + se2_b**2 / (n_b - 1))
+    p_val = 2 * stats.t.sf(abs(t_stat), gl)
+    return ResultadoWelch(media_a, ic_a, media_b, ic_b, float(t_stat), float(p_val))
+
+@st.cache_resource(show_spinner=False)
+def build_sample_index(n_full: int, seed: int = 42, max_n: int = 20000) -> np.ndarray:
+    """Permutação fixa das linhas (calculada uma vez); amostras de tamanhos diferentes são prefixos dela."""
+    rng = np.random.default_rng(seed)
+    return rng.permutation(n_full)[:max_n]
+
+def indice_amostra(n_full: int, n: int, seed: int = 42) -> np.ndarray:
+    """Posições das `n` linhas amostradas: prefixo da permutação cacheada."""
+    return build_sample_index(n_full, seed)[:n]
+
+@st.cache_data(show_spinner=False)
+def hist_data(arr: np.ndarray, nbins: int = 30) -> tuple[np.ndarray, np.ndarray]:
+    """Binning no servidor (np.histogram): retorna centros e contagens para desenhar com barras."""
+    counts, edges = np.histogram(arr[~np.isnan(arr)], bins=nbins)
+    centers = 0.5 * (edges[:-1] + edges[1:])
+    return centers, counts
+
+def fig_histograma(arr: np.ndarray, coluna: str, nbins: int = 30):
+    """Histograma a partir de `hist_data` — o navegador recebe só as barras, não os pontos."""
+    centers, counts = hist_data(arr, nbins)
+    fig = px.bar(x=centers, y=counts, labels={"x": coluna, "y": "count"}, title=f"Histograma — {coluna}")
+    fig.update_layout(height=320, bargap=0)
+    return fig
+
 @st.cache_data(show_spinner=False)
-def amostrar_df(df: pd.DataFrame, n: int, seed: int = 42) -> pd.DataFrame:
-    """Retorna uma amostra aleatória do DF (cacheada)."""
-    if n >= len(df):
-        return df
-    return df.sample(n=n, random_state=seed)
+def box_stats(df: pd.DataFrame, cat: str, num: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Quartis, cercas (1,5·IQR) e outliers por grupo, calculados no pandas (cacheado)."""
+    dados = df[[cat, num]].dropna(subset=[num])
+    if dados.empty:
+        return pd.DataFrame(columns=["q1", "median", "q3", "lowerfence", "upperfence"]), dados
+    g = dados.groupby(cat, observed=True)[num]
+    q = g.quantile([0.25, 0.5, 0.75]).unstack()
+    q.columns = ["q1", "median", "q3"]
+    iqr = q["q3"] - q["q1"]
+
+    # Cercas como no Plotly: valor mais extremo ainda dentro de q1 - 1,5·IQR / q3 + 1,5·IQR
+    lim_inf = (q["q1"] - 1.5 * iqr).reindex(dados[cat]).to_numpy()
+    lim_sup = (q["q3"] + 1.5 * iqr).reindex(dados[cat]).to_numpy()
+    valores = dados[num].to_numpy(dtype=np.float64)
+    dentro = (valores >= lim_inf) & (valores <= lim_sup)
+    cercas = dados[dentro].groupby(cat, observed=True)[num].agg(lowerfence="min", upperfence="max")
+    return q.join(cercas), dados[~dentro]
+
+def fig_boxplot(df: pd.DataFrame, cat: str, num: str, titulo: str):
+    """Boxplot com quartis pré-calculados (`box_stats`): um único go.Box com um elemento por grupo
+    e um único go.Scatter com todos os outliers (nada de trace por grupo)."""
+    if df[cat].nunique() > MAX_GRUPOS_BOX:
+        # Com grupos demais (ex.: IDs) as estatísticas por grupo pesam mais que os próprios pontos
+        fig = px.box(df, x=cat, y=num, points="outliers", title=titulo)
+        fig.update_layout(height=320)
+        return fig
+    resumo, outliers = box_stats(df, cat, num)
+    cor = px.colors.qualitative.Plotly[0]
+    fig = go.Figure()
+    fig.add_trace(go.Box(
+        x=resumo.index.astype(str), q1=resumo["q1"], median=resumo["median"], q3=resumo["q3"],
+        lowerfence=resumo["lowerfence"], upperfence=resumo["upperfence"],
+        marker_color=cor, name=num, showlegend=False,
+    ))
+    if len(outliers):
+        fig.add_trace(go.Scatter(
+            x=outliers[cat].astype(str), y=outliers[num], mode="markers", name="outliers",
+            marker=dict(color=cor, size=4), showlegend=False,
+        ))
+    fig.update_layout(title=titulo, height=320, xaxis_title=cat, yaxis_title=num)
+    return fig
 
 def ler_md_opcional(nome_arquivo: str, placeholder: str) -> str:
     """Lê data/<nome_arquivo>.md se existir; senão retorna placeholder."""
@@ -121,15 +381,28 @@ def ler_md_opcional(nome_arquivo: str, placeholder: str) -> str:
 # IMPORTAÇÃO DA BASE
 # =========================
 try:
-    df = carregar_excel()
+    MTIME_EXCEL = int(os.path.getmtime(CAMINHO_EXCEL)) if os.path.exists(CAMINHO_EXCEL) else 0
+    df = carregar_excel(MTIME_EXCEL)
 except Exception as e:
     st.error(f"❌ Erro ao carregar a base: {e}")
     st.stop()
 
 colunas_num, colunas_cat = identificar_colunas(df)
 
-# Cria uma versão "leve" do DF para gráficos/testes
-df_viz = amostrar_df(df, TAM_AMOSTRA) if USAR_AMOSTRA else df
+# Registra a base: as funções cacheadas recebem só o id, sem hash do DF a cada chamada.
+# O id usa o mesmo mtime passado a carregar_excel: quando o Excel muda, dados e id mudam juntos.
+# Ao registrar um id novo, saem do registro (e dos arrays em cache_resource) a base e a amostra antigas.
+DF_ID = f"df_main_v{CACHE_VERSAO}_{MTIME_EXCEL}_{df.shape[0]}x{df.shape[1]}"
+_registro = _reg()
+if DF_ID not in _registro:
+    if _registro:
+        numeric_arrays.clear()
+    _registro.clear()
+    _registro[DF_ID] = df
+
+# Versão "leve" do DF para gráficos/testes: o id da amostra inclui o tamanho, então caches
+# por id não misturam amostras diferentes; _frame/valores_viz usam o mesmo índice
+VIZ_ID = f"{DF_ID}|{TAM_AMOSTRA}" if USAR_AMOSTRA and TAM_AMOSTRA < len(df) else DF_ID
 
 # =========================
 # ABAS
@@ -252,6 +525,190 @@ with tabs[2]:
     st.markdown(texto_skills)
 
 
+# -------------------------
+# 📈 ANÁLISE DE DADOS — SUB-ABAS (fragmentos: só a sub-aba interagida reexecuta)
+# -------------------------
+# ---------- 📦 Bases & Tipos ----------
+@st.fragment
+def _tab_bases(df_id: str) -> None:
+    """Sub-aba Bases & Tipos: amostra da base e tabela de tipos/nulos."""
+    df = _frame(df_id)
+    st.subheader("Amostra do Dataset")
+    st.write("**Dimensões (completas):** ", df.shape)
+    # Slider dentro do fragmento: mudar o nº de linhas reexecuta só esta sub-aba
+    limite_tabela = st.slider("Linhas para exibição", 5, 200, 20, 5, key="limite_tabela")
+    st.dataframe(df.head(limite_tabela), use_container_width=True, height=240)
+
+    st.subheader("Tipos de Variáveis e % de Nulos")
+    st.dataframe(tabela_tipos(df_id), use_container_width=True, height=280)
+
+    
+    st.info(
+            "**Perguntas de análise sugeridas**  \n"
+            "- Qual o valor médio dos pedidos por categoria/status?  \n"
+            "- Existe diferença significativa entre pedidos B2B e não-B2B?  \n"
+            "- Há correlação entre quantidade (Qty) e valor do pedido?  "
+        )
+
+
+# ---------- 🧮 Estatísticas ----------
+@st.fragment
+def _tab_stats(df_id: str, viz_id: str, colunas_num: list[str]) -> None:
+    """Sub-aba Estatísticas: resumo descritivo e histogramas das colunas escolhidas."""
+    st.subheader("Resumo Descritivo")
+    if st.toggle("Calcular estatísticas descritivas", value=not MODO_LEVE, key="stats_toggle"):
+        if colunas_num:
+            max_cols = st.slider(
+                "Máximo de colunas numéricas a resumir",
+                1, max(1, len(colunas_num)),
+                min(5, len(colunas_num)),
+                key="max_cols_stats"
+            )
+            cols_sel = st.multiselect(
+                "Escolha colunas numéricas (limite acima)",
+                options=colunas_num,
+                default=colunas_num[:max_cols],
+                key="cols_sel_stats"
+            )[:max_cols]
+
+            if cols_sel:
+                resumo = estatisticas_basicas(df_id, tuple(cols_sel))
+                st.dataframe(resumo, use_container_width=True, height=300)
+
+                # Histogramas rápidos sobre amostra
+                if st.toggle(
+                    "Mostrar histogramas (amostra)",
+                    value=(not MODO_LEVE and len(cols_sel) <= 2),
+                    key="histo_toggle"
+                ):
+                    for gc in cols_sel[:2]:
+                        fig = fig_histograma(valores_viz(viz_id, gc), gc)
+                        st.plotly_chart(fig, use_container_width=True, key=f"hist_stats_{gc}")
+            else:
+                st.info("Selecione ao menos 1 coluna numérica.")
+        else:
+            st.warning("Nenhuma coluna numérica detectada.")
+
+
+# ---------- 🧪 Teste t (Welch) ----------
+@st.fragment
+def _tab_welch(viz_id: str, colunas_num: list[str], colunas_cat: list[str]) -> None:
+    """Sub-aba Teste t: ICs e teste de Welch entre dois grupos da amostra."""
+    df_viz = _frame(viz_id)
+    st.subheader("Intervalos de Confiança & Teste de Hipótese (t de Welch)")
+    st.markdown("""
+        **Justificativa do Teste t de Welch**  
+        O teste t de Welch foi escolhido por ser apropriado para comparar médias de dois grupos com variâncias possivelmente diferentes e tamanhos de amostra distintos.  
+        """)
+    if st.toggle("Executar teste entre dois grupos", value=not MODO_LEVE, key="welch_toggle"):
+        col_a, col_b = st.columns(2)
+        with col_a:
+            metrica = st.selectbox("Métrica numérica", options=colunas_num or [], key="welch_metric")
+        with col_b:
+            grupo = st.selectbox(
+                "Variável categórica (ex.: Venda_B2B, Status_Pedido, Categoria)",
+                options=colunas_cat or [],
+                key="welch_group"
+            )
+
+        if metrica and grupo:
+            # Momentos por grupo cacheados: trocar A/B é só consulta + aritmética. O índice (n > 0)
+            # já dá os grupos presentes na amostra, sem listar categorias vazias da base completa.
+            momentos, centro = group_moments(viz_id, grupo, metrica)
+            categorias = momentos.index[momentos["n"] > 0].tolist()
+            if len(categorias) < 2:
+                st.warning("A variável categórica precisa ter ao menos 2 grupos.")
+            else:
+                g1, g2 = st.columns(2)
+                with g1:
+                    cat1 = st.selectbox("Grupo A", options=categorias, index=0, format_func=str, key="welch_cat1")
+                with g2:
+                    cat2 = st.selectbox("Grupo B", options=categorias, index=1 if len(categorias) > 1 else 0, format_func=str, key="welch_cat2")
+
+                mom_a = momentos_grupo(momentos, cat1)
+                mom_b = momentos_grupo(momentos, cat2)
+
+                min_amostra = st.slider("Tamanho mínimo por grupo", 5, 200, 20, 5, key="welch_min")
+
+                if mom_a[0] >= min_amostra and mom_b[0] >= min_amostra:
+                    media_a, ic_a, media_b, ic_b, t_stat, p_val = welch_report(mom_a, mom_b, centro)
+
+                    colx, coly, colz = st.columns(3)
+                    with colx:
+                        st.metric(f"Média — {cat1}", f"{media_a:,.2f}")
+                        st.caption(f"IC95%: [{ic_a[0]:,.2f}, {ic_a[1]:,.2f}]")
+                    with coly:
+                        st.metric(f"Média — {cat2}", f"{media_b:,.2f}")
+                        st.caption(f"IC95%: [{ic_b[0]:,.2f}, {ic_b[1]:,.2f}]")
+                    with colz:
+                        delta = media_a - media_b
+                        st.metric("Diferença (A - B)", f"{delta:,.2f}")
+
+                    st.write(f"**Teste t (Welch)** → t = {t_stat:.3f}, p-valor = {p_val:.4f}")
+                    st.info("Critério 5%: p < 0.05 → diferença estatística nas médias.")
+
+                    if st.toggle("Mostrar gráficos comparativos (amostra)", value=not MODO_LEVE, key="welch_plots"):
+                        # Métrica já em float64 (valores_viz); só as máscaras de grupo são calculadas aqui
+                        x = valores_viz(viz_id, metrica)
+                        valido = ~np.isnan(x)
+                        df_a = x[df_viz[grupo].eq(cat1).to_numpy(dtype=bool, na_value=False) & valido]
+                        df_b = x[df_viz[grupo].eq(cat2).to_numpy(dtype=bool, na_value=False) & valido]
+
+                        df_plot = pd.concat([
+                            pd.DataFrame({metrica: df_a, grupo: f"{cat1}"}),
+                            pd.DataFrame({metrica: df_b, grupo: f"{cat2}"}),
+                        ], ignore_index=True)
+
+                        fig1 = px.histogram(
+                            df_plot, x=metrica, color=grupo, barmode="overlay", nbins=30,
+                            title=f"Distribuição — {metrica} por {grupo} ({cat1} vs {cat2})"
+                        )
+                        fig1.update_layout(height=320)
+                        st.plotly_chart(
+                            fig1, use_container_width=True,
+                            key=f"welch_hist_{metrica}_{cat1}_{cat2}"
+                        )
+                        fig2 = fig_boxplot(df_plot, grupo, metrica, f"Boxplot — {metrica} por {grupo}")
+                        st.plotly_chart(
+                        fig2, use_container_width=True,
+                        key=f"welch_box_{metrica}_{cat1}_{cat2}"
+                    )                    
+                else:
+                    st.warning(f"Amostra insuficiente. {cat1}: n={mom_a[0]} | {cat2}: n={mom_b[0]}")
+        else:
+            st.info("Selecione uma **métrica numérica** e um **grupo categórico** para comparar dois grupos.")
+
+
+# ---------- 📈 Gráficos ----------
+@st.fragment
+def _tab_graficos(viz_id: str, colunas_num: list[str], colunas_cat: list[str]) -> None:
+    """Sub-aba Gráficos: histograma e boxplot sobre a amostra."""
+    df_viz = _frame(viz_id)
+    st.subheader("Exploração Visual (amostra)")
+    colg1, colg2 = st.columns(2)
+
+    with colg1:
+        if colunas_num:
+            num_sel = st.selectbox("Histograma — escolha a coluna numérica", options=colunas_num, key="viz_hist_col")
+            fig = fig_histograma(valores_viz(viz_id, num_sel), num_sel)
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("Sem colunas numéricas para histograma.")
+
+    with colg2:
+        if colunas_cat and colunas_num:
+            cat_sel = st.selectbox("Boxplot — variável categórica", options=colunas_cat, key="viz_box_cat")
+            num_box = st.selectbox("Boxplot — métrica numérica", options=colunas_num, key="viz_box_num")
+            df_box = pd.DataFrame({
+                cat_sel: df_viz[cat_sel].astype(str).to_numpy(),
+                num_box: valores_viz(viz_id, num_box),
+            })
+            fig = fig_boxplot(df_box, cat_sel, num_box, f"Boxplot — {num_box} por {cat_sel}")
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("Preciso de pelo menos 1 coluna categórica e 1 numérica.")
+
+
 # -------------------------
 # 📈 ANÁLISE DE DADOS
 # -------------------------
@@ -265,167 +722,11 @@ with tabs[3]:
         "📈 Gráficos"
     ])
 
-    # ---------- 📦 Bases & Tipos ----------
     with sub[0]:
-        st.subheader("Amostra do Dataset")
-        st.write("**Dimensões (completas):** ", df.shape)
-        st.dataframe(df.head(LIMITE_TABELA), use_container_width=True, height=240)
-
-        st.subheader("Tipos de Variáveis e % de Nulos")
-        st.dataframe(tabela_tipos(df).head(200), use_container_width=True, height=280)
-
-        
-        st.info(
-                "**Perguntas de análise sugeridas**  \n"
-                "- Qual o valor médio dos pedidos por categoria/status?  \n"
-                "- Existe diferença significativa entre pedidos B2B e não-B2B?  \n"
-                "- Há correlação entre quantidade (Qty) e valor do pedido?  "
-            )
-
-
-    # ---------- 🧮 Estatísticas ----------
+        _tab_bases(DF_ID)
     with sub[1]:
-        st.subheader("Resumo Descritivo")
-        if st.toggle("Calcular estatísticas descritivas", value=not MODO_LEVE, key="stats_toggle"):
-            if colunas_num:
-                max_cols = st.slider(
-                    "Máximo de colunas numéricas a resumir",
-                    1, max(1, len(colunas_num)),
-                    min(5, len(colunas_num)),
-                    key="max_cols_stats"
-                )
-                cols_sel = st.multiselect(
-                    "Escolha colunas numéricas (limite acima)",
-                    options=colunas_num,
-                    default=colunas_num[:max_cols],
-                    key="cols_sel_stats"
-                )[:max_cols]
-
-                if cols_sel:
-                    resumo = estatisticas_basicas(df[cols_sel], cols_sel)
-                    st.dataframe(resumo, use_container_width=True, height=300)
-
-                    # Histogramas rápidos sobre amostra
-                    if st.toggle(
-                        "Mostrar histogramas (amostra)",
-                        value=(not MODO_LEVE and len(cols_sel) <= 2),
-                        key="histo_toggle"
-                    ):
-                        for gc in cols_sel[:2]:
-                            fig = px.histogram(df_viz, x=gc, nbins=30, title=f"Histograma — {gc}")
-                            fig.update_layout(height=320)
-                            st.plotly_chart(fig, use_container_width=True, key=f"hist_stats_{gc}")
-                else:
-                    st.info("Selecione ao menos 1 coluna numérica.")
-            else:
-                st.warning("Nenhuma coluna numérica detectada.")
-
-    # ---------- 🧪 Teste t (Welch) ----------
+        _tab_stats(DF_ID, VIZ_ID, colunas_num)
     with sub[2]:
-        st.subheader("Intervalos de Confiança & Teste de Hipótese (t de Welch)")
-        st.markdown("""
-            **Justificativa do Teste t de Welch**  
-            O teste t de Welch foi escolhido por ser apropriado para comparar médias de dois grupos com variâncias possivelmente diferentes e tamanhos de amostra distintos.  
-            """)
-        if st.toggle("Executar teste entre dois grupos", value=not MODO_LEVE, key="welch_toggle"):
-            col_a, col_b = st.columns(2)
-            with col_a:
-                metrica = st.selectbox("Métrica numérica", options=colunas_num or [], key="welch_metric")
-            with col_b:
-                grupo = st.selectbox(
-                    "Variável categórica (ex.: Venda_B2B, Status_Pedido, Categoria)",
-                    options=colunas_cat or [],
-                    key="welch_group"
-                )
-
-            if metrica and grupo:
-                categorias = df_viz[grupo].dropna().astype(str).unique().tolist()
-                if len(categorias) < 2:
-                    st.warning("A variável categórica precisa ter ao menos 2 grupos.")
-                else:
-                    g1, g2 = st.columns(2)
-                    with g1:
-                        cat1 = st.selectbox("Grupo A", options=categorias, index=0, key="welch_cat1")
-                    with g2:
-                        cat2 = st.selectbox("Grupo B", options=categorias, index=1 if len(categorias) > 1 else 0, key="welch_cat2")
-
-                    df_a = pd.to_numeric(df_viz.loc[df_viz[grupo].astype(str) == cat1, metrica], errors="coerce").dropna()
-                    df_b = pd.to_numeric(df_viz.loc[df_viz[grupo].astype(str) == cat2, metrica], errors="coerce").dropna()
-
-                    min_amostra = st.slider("Tamanho mínimo por grupo", 5, 200, 20, 5, key="welch_min")
-
-                    if len(df_a) >= min_amostra and len(df_b) >= min_amostra:
-                        media_a, ic_a = ic_media(df_a)
-                        media_b, ic_b = ic_media(df_b)
-                        t_stat, p_val = stats.ttest_ind(df_a, df_b, equal_var=False, nan_policy="omit")
-
-                        colx, coly, colz = st.columns(3)
-                        with colx:
-                            st.metric(f"Média — {cat1}", f"{media_a:,.2f}")
-                            st.caption(f"IC95%: [{ic_a[0]:,.2f}, {ic_a[1]:,.2f}]")
-                        with coly:
-                            st.metric(f"Média — {cat2}", f"{media_b:,.2f}")
-                            st.caption(f"IC95%: [{ic_b[0]:,.2f}, {ic_b[1]:,.2f}]")
-                        with colz:
-                            delta = media_a - media_b
-                            st.metric("Diferença (A - B)", f"{delta:,.2f}")
-
-                        st.write(f"**Teste t (Welch)** → t = {t_stat:.3f}, p-valor = {p_val:.4f}")
-                        st.info("Critério 5%: p < 0.05 → diferença estatística nas médias.")
-
-                        if st.toggle("Mostrar gráficos comparativos (amostra)", value=not MODO_LEVE, key="welch_plots"):
-                            df_plot = pd.concat([
-                                pd.DataFrame({metrica: df_a, grupo: f"{cat1}"}),
-                                pd.DataFrame({metrica: df_b, grupo: f"{cat2}"}),
-                            ], ignore_index=True)
-
-                            fig1 = px.histogram(
-                                df_plot, x=metrica, color=grupo, barmode="overlay", nbins=30,
-                                title=f"Distribuição — {metrica} por {grupo} ({cat1} vs {cat2})"
-                            )
-                            fig1.update_layout(height=320)
-                            st.plotly_chart(
-                                fig1, use_container_width=True,
-                                key=f"welch_hist_{metrica}_{cat1}_{cat2}"
-                            )
-                            fig2 = px.box(df_plot, x=grupo, y=metrica, points="outliers",
-                                          title=f"Boxplot — {metrica} por {grupo}")
-                            fig2.update_layout(height=320)
-                            st.plotly_chart(
-                            fig2, use_container_width=True,
-                            key=f"welch_box_{metrica}_{cat1}_{cat2}"
-                        )                    
-                    else:
-                        st.warning(f"Amostra insuficiente. {cat1}: n={len(df_a)} | {cat2}: n={len(df_b)}")
-            else:
-                st.info("Selecione uma **métrica numérica** e um **grupo categórico** para comparar dois grupos.")
-
-
-    # ---------- 📈 Gráficos ----------
+        _tab_welch(VIZ_ID, colunas_num, colunas_cat)
     with sub[3]:
-        st.subheader("Exploração Visual (amostra)")
-        colg1, colg2 = st.columns(2)
-
-        with colg1:
-            if colunas_num:
-                num_sel = st.selectbox("Histograma — escolha a coluna numérica", options=colunas_num, key="viz_hist_col")
-                fig = px.histogram(df_viz, x=num_sel, nbins=30, title=f"Histograma — {num_sel}")
-                fig.update_layout(height=320)
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("Sem colunas numéricas para histograma.")
-
-        with colg2:
-            if colunas_cat and colunas_num:
-                cat_sel = st.selectbox("Boxplot — variável categórica", options=colunas_cat, key="viz_box_cat")
-                num_box = st.selectbox("Boxplot — métrica numérica", options=colunas_num, key="viz_box_num")
-                df_box = pd.DataFrame({
-                    cat_sel: df_viz[cat_sel].astype(str),
-                    num_box: pd.to_numeric(df_viz[num_box], errors="coerce")
-                })
-                fig = px.box(df_box, x=cat_sel, y=num_box, points="outliers",
-                             title=f"Boxplot — {num_box} por {cat_sel}")
-                fig.update_layout(height=320)
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("Preciso de pelo menos 1 coluna categórica e 1 numérica.")
+        _tab_graficos(VIZ_ID, colunas_num, colunas_cat)
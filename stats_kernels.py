@@ -0,0 +1,68 @@
+"""Kernels numéricos de passada única usados pelas estatísticas do dashboard.
+
+Com Numba instalado, `welford` é compilado (JIT com cache em disco); sem ele,
+cai para as reduções equivalentes do NumPy.
+"""
+import os
+
+import numpy as np
+
+# Cache do JIT em disco (antes de importar o Numba): reinícios do Streamlit reaproveitam o código compilado
+os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join("data", ".numba_cache"))
+try:
+    os.makedirs(os.environ["NUMBA_CACHE_DIR"], exist_ok=True)
+except OSError:
+    pass
+
+try:
+    from numba import njit, types
+    NUMBA_DISPONIVEL = True
+except ImportError:
+    NUMBA_DISPONIVEL = False
+
+
+if NUMBA_DISPONIVEL:
+    @njit(cache=True, fastmath=True)
+    def welford(x):
+        """Algoritmo de Welford: (count, média, M2, min, max) em uma única passada. Espera `x` sem NaN.
+
+        Estado inicial vem de x[0] (e não de ±inf): com fastmath o LLVM assume operandos finitos.
+        """
+        if x.shape[0] == 0:
+            return 0, 0.0, 0.0, 0.0, 0.0
+        count = 1
+        media = x[0]
+        m2 = 0.0
+        mn = x[0]
+        mx = x[0]
+        for i in range(1, x.shape[0]):
+            v = x[i]
+            count += 1
+            delta = v - media
+            media += delta / count
+            m2 += delta * (v - media)
+            if v < mn:
+                mn = v
+            if v > mx:
+                mx = v
+        return count, media, m2, mn, mx
+
+    # Aquecimento na importação: carrega (ou compila uma vez) a assinatura usada, arrays float64 contíguos
+    welford.compile((types.float64[::1],))
+else:
+    def welford(x):
+        """Fallback sem Numba: mesmas saídas via np.mean/np.var. Espera `x` sem NaN."""
+        count = x.shape[0]
+        if count == 0:
+            return 0, 0.0, 0.0, 0.0, 0.0
+        return count, float(np.mean(x)), float(np.var(x)) * count, float(np.min(x)), float(np.max(x))
+
+
+def resumo_1d(arr: np.ndarray) -> tuple[int, float, float, float, float]:
+    """count, média, variância (ddof=1), min e max de um array float64, ignorando NaN."""
+    x = arr[~np.isnan(arr)]
+    count, media, m2, mn, mx = welford(x)
+    if count == 0:
+        return 0, np.nan, np.nan, np.nan, np.nan
+    var = m2 / (count - 1) if count > 1 else np.nan
+    return int(count), float(media), float(var), float(mn), float(mx)